@@ -1,14 +1,17 @@
 import os
+import asyncio
 import logging
-import threading
-import json
 import re
-import requests
-import pymongo
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import time
+import functools
+from collections import OrderedDict
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, UpdateOne, WriteConcern
+from telegram import CallbackQuery, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
+    AIORateLimiter,
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
@@ -17,27 +20,75 @@ from telegram.ext import (
     ConversationHandler,
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # --- Web Server to satisfy Render's health checks ---
-class HealthCheckHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(b"OK")
-
-def run_web_server():
+# Polling mode only: with WEBHOOK_URL set, PTB's webhook server owns PORT and
+# this listener is not started (see WEBHOOK_URL below).
+HEALTH_CHECK_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 2\r\n"
+    b"\r\n"
+    b"OK"
+)
+HEALTH_CHECK_IDLE_TIMEOUT = 10
+_health_server = None
+# Open keep-alive connections as {handler task: writer}; Server.close() does
+# not end them on Python 3.11.
+_health_connections = {}
+
+async def handle_health_check(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # Every request gets the same answer; keep the connection open for the
+    # next probe until the client goes away or stays idle too long.
+    task = asyncio.current_task()
+    _health_connections[task] = writer
+    try:
+        while True:
+            await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEALTH_CHECK_IDLE_TIMEOUT)
+            writer.write(HEALTH_CHECK_RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        _health_connections.pop(task, None)
+        writer.close()
+
+async def start_web_server() -> None:
+    global _health_server
     port = int(os.environ.get("PORT", 8080))
-    server_address = ('', port)
-    httpd = HTTPServer(server_address, HealthCheckHandler)
+    _health_server = await asyncio.start_server(handle_health_check, port=port)
     logger.info(f"Starting simple web server for health checks on port {port}")
-    httpd.serve_forever()
+
+async def stop_web_server() -> None:
+    if _health_server is not None:
+        _health_server.close()
+        # Closing the transport hands the pending read an EOF, so each
+        # handler leaves its loop and finishes normally.
+        for writer in list(_health_connections.values()):
+            writer.close()
+        await asyncio.gather(*_health_connections, return_exceptions=True)
+        await _health_server.wait_closed()
 
 # --- Configuration ---
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 ADMIN_ID = int(os.environ.get("ADMIN_ID"))
 MONGO_DB_URL = os.environ.get("MONGO_DB_URL")
 RAZORPAY_LINK = os.environ.get("RAZORPAY_LINK", "https://razorpay.me/@gateprep?amount=CVDUr6Uxp2FOGZGwAHntNg%3D%3D")
+# Public base URL (e.g. https://<app>.onrender.com). When set, Telegram pushes
+# updates to <WEBHOOK_URL>/webhook instead of the bot long polling getUpdates.
+# Webhook mode has no health endpoint: PTB's server only routes POST /webhook
+# and answers 404 everywhere else, so a Render health check path such as "/"
+# fails. Clear the health check path (Render then only checks the port is
+# open) before setting this.
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
 
 # --- Logging Setup ---
 logging.basicConfig(
@@ -47,22 +98,250 @@ logger = logging.getLogger(__name__)
 
 # --- Database Connection ---
 try:
-    client = pymongo.MongoClient(MONGO_DB_URL)
+    client = AsyncIOMotorClient(
+        MONGO_DB_URL,
+        maxPoolSize=50,
+        minPoolSize=10,
+        maxIdleTimeMS=60000,
+        waitQueueTimeoutMS=2500,
+        serverSelectionTimeoutMS=3000,
+        socketTimeoutMS=5000,
+        appname="coursebot",
+    )
     db = client.get_default_database()
     courses_collection = db["courses"]
-    users_collection = db["users"]
-    logger.info("Successfully connected to MongoDB.")
+    # User profiles are re-upserted on the next /start if a write is lost, so
+    # skip waiting on the journal regardless of the cluster's default concern.
+    users_collection = db.get_collection("users", write_concern=WriteConcern(w=1, j=False))
 except Exception as e:
     logger.error(f"FATAL: Could not connect to MongoDB: {e}")
     exit()
 
 # --- Helper Functions ---
+# Telegram rejects messages over 4096 characters; leave room for escapes.
+MESSAGE_PAGE_SIZE = 3500
+USER_STATS_PROJECTION = {"first_name": 1, "username": 1}
+# Admin replies only ever target recent forwards; older ones fall back to the
+# "(ID: ...)" tag in the message text.
+FORWARDED_MESSAGES_LIMIT = 10000
+MARKDOWN_ESCAPE_TABLE = str.maketrans({char: '\\' + char for char in '_*[]()~`>#+-=|{}.!\\'})
+
 def escape_markdown(text: str) -> str:
     """Escapes special characters for Telegram MarkdownV2."""
     if not isinstance(text, str):
         return ""
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+    return text.translate(MARKDOWN_ESCAPE_TABLE)
+
+# Splits and trims in one pass: the whitespace around each ";" goes with it.
+ARG_SEPARATOR_PATTERN = re.compile(r"\s*;\s*")
+
+def split_command_args(args: list, count: int = 4) -> list:
+    """Splits "a; b; c; d" command arguments into exactly `count` stripped fields.
+
+    Only the first `count - 1` semicolons separate fields, so the last field
+    (a status or button text) may itself contain ";".
+    """
+    parts = ARG_SEPARATOR_PATTERN.split(" ".join(args).strip(), maxsplit=count - 1)
+    if len(parts) != count:
+        raise ValueError(f"Expected {count} fields separated by ';'")
+    return parts
+
+def extract_tagged_user_id(message):
+    """Returns the user ID from the "(ID: ...)" tag of a message forwarded to the admin."""
+    if message.text:
+        rendered = message.text_markdown_v2
+    elif message.caption:
+        rendered = message.caption_markdown_v2
+    else:
+        return None
+    match = USER_ID_PATTERN.search(rendered)
+    return int(match.group(1)) if match else None
+
+def remember_forwarded_message(context: ContextTypes.DEFAULT_TYPE, sent, user_id: int) -> None:
+    """Records which user a message in the admin chat was forwarded from."""
+    # Once evicted, replies rely on the ID tag, so check that the message
+    # Telegram actually rendered reads back as this user.
+    tagged_user_id = extract_tagged_user_id(sent)
+    if tagged_user_id != user_id:
+        logger.error(f"ID tag on forwarded message {sent.message_id} reads {tagged_user_id}, expected {user_id}")
+    forwarded = context.bot_data.setdefault("forwarded_messages", OrderedDict())
+    forwarded[sent.message_id] = user_id
+    forwarded.move_to_end(sent.message_id)
+    if len(forwarded) > FORWARDED_MESSAGES_LIMIT:
+        forwarded.popitem(last=False)
+
+# --- Course Cache ---
+# Courses only change through admin commands, so the sorted course list and
+# the main menu built from it are kept until an admin mutation drops them.
+# The TTL picks up edits made directly in MongoDB or by another instance.
+COURSE_CACHE_TTL = 60
+# Only the fields the main menu and /listcourses show; skips demo_lectures.
+COURSE_LIST_PROJECTION = {"name": 1, "price": 1, "status": 1, "order": 1}
+_COURSES = None
+_COURSES_EXPIRES_AT = 0.0
+_COURSE_LIST_MARKUP = None
+# Bumped by every invalidation. A fill whose query was already in flight when
+# an admin edit landed sees a different generation and does not store its
+# pre-edit result.
+_course_cache_generation = 0
+
+async def get_courses() -> list:
+    global _COURSES, _COURSES_EXPIRES_AT, _COURSE_LIST_MARKUP
+    if _COURSES is None or time.monotonic() >= _COURSES_EXPIRES_AT:
+        generation = _course_cache_generation
+        courses = await courses_collection.find({}, COURSE_LIST_PROJECTION).sort("order", 1).to_list(length=None)
+        if generation != _course_cache_generation:
+            return courses
+        _COURSES = courses
+        _COURSES_EXPIRES_AT = time.monotonic() + COURSE_CACHE_TTL
+        _COURSE_LIST_MARKUP = None
+    return _COURSES
+
+def _build_course_list_markup(courses: list) -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{course['name']} - ₹{course['price']}" + (" (Coming Soon)" if course.get('status') == 'coming_soon' else ""),
+            callback_data=course['_id'],
+        )]
+        for course in courses
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+async def get_course_list_markup() -> InlineKeyboardMarkup:
+    global _COURSE_LIST_MARKUP
+    courses = await get_courses()
+    if courses is not _COURSES:
+        # Fetched across an invalidation; don't cache a markup built from it.
+        return _build_course_list_markup(courses)
+    if _COURSE_LIST_MARKUP is None:
+        _COURSE_LIST_MARKUP = _build_course_list_markup(courses)
+    return _COURSE_LIST_MARKUP
+
+def invalidate_course_cache() -> None:
+    global _COURSES, _COURSE_LIST_MARKUP, _course_cache_generation
+    _COURSES = None
+    _COURSE_LIST_MARKUP = None
+    _course_cache_generation += 1
+
+# Full course documents per key, with the course detail and demo subject
+# keyboards built from them, so all three expire together. Unknown keys are
+# not cached, so the dict never grows past the number of real courses.
+_COURSE_DOCS = {}
+
+async def _get_course_entry(course_key: str):
+    entry = _COURSE_DOCS.get(course_key)
+    if entry is None or time.monotonic() >= entry["expires_at"]:
+        generation = _course_cache_generation
+        course = await courses_collection.find_one({"_id": course_key})
+        if course is None:
+            return None
+        entry = {
+            "expires_at": time.monotonic() + COURSE_CACHE_TTL,
+            "course": course,
+            "markup": None,
+            "demo_markup": None,
+        }
+        if generation == _course_cache_generation:
+            _COURSE_DOCS[course_key] = entry
+    return entry
+
+async def get_course(course_key: str):
+    entry = await _get_course_entry(course_key)
+    return entry["course"] if entry else None
+
+def get_course_markup(course: dict) -> InlineKeyboardMarkup:
+    course_key = course["_id"]
+    entry = _COURSE_DOCS.get(course_key)
+    # Only cache alongside the exact document it was built from.
+    if entry is None or entry["course"] is not course:
+        entry = {}
+    reply_markup = entry.get("markup")
+    if reply_markup is None:
+        buttons = []
+        if course.get("demo_lectures", {}).get("subjects"):
+            buttons.append([InlineKeyboardButton("🎬 Watch Demo", callback_data=f"action_demo_{course_key}")])
+        buttons.extend([
+            [InlineKeyboardButton("💬 Talk to Admin", callback_data=f"action_talk_admin_{course_key}")],
+            [InlineKeyboardButton("🛒 Buy Full Course", callback_data=f"action_buy_{course_key}")],
+            [InlineKeyboardButton("⬅️ Back to Courses", callback_data="main_menu")]
+        ])
+        reply_markup = entry["markup"] = InlineKeyboardMarkup(buttons)
+    return reply_markup
+
+async def get_demo_markup(course_key: str):
+    entry = await _get_course_entry(course_key)
+    if entry is None:
+        return None
+    reply_markup = entry["demo_markup"]
+    if reply_markup is None:
+        course = entry["course"]
+        if not course.get("demo_lectures", {}).get("subjects"):
+            return None
+        keyboard = [
+            [InlineKeyboardButton(details["button_text"], callback_data=f"demo_{course_key}_{key}")]
+            for key, details in course["demo_lectures"]["subjects"].items()
+        ]
+        keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data=course_key)])
+        reply_markup = entry["demo_markup"] = InlineKeyboardMarkup(keyboard)
+    return reply_markup
+
+def invalidate_course(course_key: str) -> None:
+    global _course_cache_generation
+    _COURSE_DOCS.pop(course_key, None)
+    _course_cache_generation += 1
+
+# --- User Registry ---
+# Profiles already seen by this process, so a returning user's /start only
+# queues a write when their name or username actually changed. Queued
+# profiles are written to MongoDB in one bulk upsert per flush interval,
+# or as soon as a full batch is waiting.
+USER_FLUSH_INTERVAL = 5
+USER_FLUSH_BATCH_SIZE = 500
+_KNOWN_USERS = {}
+_pending_users = {}
+_user_batch_full = asyncio.Event()
+_user_flush_stopping = asyncio.Event()
+_user_flush_task = None
+
+def save_user(user) -> None:
+    profile = (user.first_name, user.last_name, user.username)
+    if _KNOWN_USERS.get(user.id) == profile:
+        return
+    _KNOWN_USERS[user.id] = profile
+    _pending_users[user.id] = profile
+    if len(_pending_users) >= USER_FLUSH_BATCH_SIZE:
+        _user_batch_full.set()
+
+async def flush_pending_users() -> None:
+    global _pending_users
+    if not _pending_users:
+        return
+    batch, _pending_users = _pending_users, {}
+    operations = [
+        UpdateOne(
+            {"_id": user_id},
+            {"$set": {"first_name": first_name, "last_name": last_name, "username": username}},
+            upsert=True
+        )
+        for user_id, (first_name, last_name, username) in batch.items()
+    ]
+    try:
+        await users_collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to save {len(batch)} user profiles: {e}")
+        for user_id, profile in batch.items():
+            _pending_users.setdefault(user_id, profile)
+
+async def user_flush_loop() -> None:
+    # Stopped through _user_flush_stopping rather than cancelled, so a batch
+    # that is mid bulk_write is never dropped on shutdown.
+    while not _user_flush_stopping.is_set():
+        try:
+            await asyncio.wait_for(_user_batch_full.wait(), USER_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _user_batch_full.clear()
+        await flush_pending_users()
 
 # --- Bot Texts ---
 COURSE_DETAILS_TEXT = """
@@ -123,35 +402,59 @@ ADMIN_HELP_TEXT = """
 `/delcourse <key>` \- Remove a course\.
 `/set_order <key> <order_num>` \- Change course display order\.
   _Ex: /set\_order new\_course 1_
-`/adddemo <key>; <subject_key>; <msg_id>; <button_text>`
-  _Ex: /adddemo new\_course; thermo; 123; Thermodynamics 🔥_
+`/reorder <key1>,<key2>,\.\.\.` \- Put the listed courses first, in that order; the rest follow in their current order\.
+  _Ex: /reorder gate\_ce,ese,psu_
+`/adddemo <key>; <subject_key>; <msg_id>[,<msg_id>\.\.\.]; <button_text>`
+  _Ex: /adddemo new\_course; thermo; 123,124; Thermodynamics 🔥_
 `/stats` \- View bot usage statistics and user list\.
 `/broadcast <message>` \- Send a message to all users\.
 `/reply <user_id> <message>` \- Send a direct message to a user\.
 
 _Statuses: `available` or `coming_soon`_
 """
+# Course texts only depend on the course name and price, so the escaped and
+# formatted result is reused until an admin edit changes either value.
+@functools.lru_cache(maxsize=256)
+def render_course_details(course_name: str) -> str:
+    return COURSE_DETAILS_TEXT.format(course_name=escape_markdown(course_name))
+
+@functools.lru_cache(maxsize=256)
+def render_buy_text(course_name: str, price: int) -> str:
+    return BUY_COURSE_TEXT.format(course_name=escape_markdown(course_name), price=price)
+
+# --- Concurrency Limits ---
+MAX_CONCURRENT_UPDATES = 256
+# Times a request is retried after Telegram answers 429 Too Many Requests.
+RATE_LIMIT_MAX_RETRIES = 3
+
+# --- Broadcast Limits ---
+BROADCAST_CONCURRENCY = 25
+
 # --- Conversation States ---
 SELECTING_ACTION, SELECTING_DEMO_SUBJECT, FORWARD_TO_ADMIN, FORWARD_SCREENSHOT = range(4)
 
+# --- Callback Data Patterns ---
+MAIN_MENU_PATTERN = re.compile(r"^main_menu$")
+DEMO_ACTION_PATTERN = re.compile(r"^action_demo_")
+TALK_ADMIN_ACTION_PATTERN = re.compile(r"^action_talk_admin_")
+BUY_ACTION_PATTERN = re.compile(r"^action_buy_")
+SCREENSHOT_ACTION_PATTERN = re.compile(r"^action_screenshot_")
+# Course keys may contain underscores, subject keys may not (see /adddemo).
+DEMO_SUBJECT_PATTERN = re.compile(r"^demo_(?P<course>.+)_(?P<subject>[^_]+)$")
+
+# Matches the "(ID: `123`)" tag the bot puts in messages forwarded to the admin,
+# as re-rendered by text_markdown_v2. The plain text has the backticks stripped,
+# and there a user could forge a tag in their name or message; in MarkdownV2
+# their brackets and backticks come back escaped, so only the bot's tag matches.
+USER_ID_PATTERN = re.compile(r"\\\(ID: `(\d+)`\\\)")
+
 # --- Command & Message Handlers ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
-    users_collection.update_one(
-        {"_id": user.id}, 
-        {"$set": {"first_name": user.first_name, "last_name": user.last_name, "username": user.username}}, 
-        upsert=True
-    )
+    save_user(user)
     logger.info(f"User {user.first_name} ({user.id}) started the bot.")
     
-    keyboard = []
-    for course in courses_collection.find().sort("order", 1):
-        button_text = f"{course['name']} - ₹{course['price']}"
-        if course.get('status') == 'coming_soon':
-            button_text += " (Coming Soon)"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=course['_id'])])
-        
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = await get_course_list_markup()
     await update.message.reply_text(
         f"👋 Welcome, {user.first_name}!\n\nPlease select a course to view details or use /help for instructions.",
         reply_markup=reply_markup
@@ -162,14 +465,7 @@ async def main_menu_from_callback(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     await query.answer()
     
-    keyboard = []
-    for course in courses_collection.find().sort("order", 1):
-        button_text = f"{course['name']} - ₹{course['price']}"
-        if course.get('status') == 'coming_soon':
-            button_text += " (Coming Soon)"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=course['_id'])])
-        
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = await get_course_list_markup()
     await query.edit_message_text(
         "Please select a course to view details:",
         reply_markup=reply_markup
@@ -177,14 +473,7 @@ async def main_menu_from_callback(update: Update, context: ContextTypes.DEFAULT_
     return SELECTING_ACTION
 
 async def main_menu_from_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    keyboard = []
-    for course in courses_collection.find().sort("order", 1):
-        button_text = f"{course['name']} - ₹{course['price']}"
-        if course.get('status') == 'coming_soon':
-            button_text += " (Coming Soon)"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=course['_id'])])
-        
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = await get_course_list_markup()
     await update.message.reply_text(
         "You can select another course:",
         reply_markup=reply_markup
@@ -196,71 +485,74 @@ async def course_selection_callback(update: Update, context: ContextTypes.DEFAUL
     await query.answer()
     course_key = query.data
     
-    course = courses_collection.find_one({"_id": course_key})
+    course = await get_course(course_key)
 
     if course:
-        context.user_data['selected_course'] = course
-
-        buttons = []
-        if course.get("demo_lectures", {}).get("subjects"):
-             buttons.append([InlineKeyboardButton("🎬 Watch Demo", callback_data=f"action_demo_{course_key}")])
-        
-        buttons.extend([
-            [InlineKeyboardButton("💬 Talk to Admin", callback_data=f"action_talk_admin_{course_key}")],
-            [InlineKeyboardButton("🛒 Buy Full Course", callback_data=f"action_buy_{course_key}")],
-            [InlineKeyboardButton("⬅️ Back to Courses", callback_data="main_menu")]
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(buttons)
-        course_details = COURSE_DETAILS_TEXT.format(course_name=escape_markdown(course['name']))
+        context.user_data['selected_course_key'] = course_key
+        reply_markup = get_course_markup(course)
+        course_details = render_course_details(course['name'])
         await query.edit_message_text(text=course_details, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
 
     return SELECTING_ACTION
 
+async def show_demo_menu(query: CallbackQuery, course_key: str) -> int:
+    reply_markup = await get_demo_markup(course_key)
+    try:
+        if reply_markup:
+            await query.edit_message_text("Please select a subject to watch the demo lecture:", reply_markup=reply_markup)
+            return SELECTING_DEMO_SUBJECT
+        await query.edit_message_text("No demo lectures available for this course.")
+    except BadRequest as e:
+        # Redrawing the menu that is already shown is not an error.
+        if "not modified" not in str(e).lower():
+            raise
+        if reply_markup:
+            return SELECTING_DEMO_SUBJECT
+    return SELECTING_ACTION
+
 async def handle_demo_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    course_key = query.data.split('_')[-1]
-    
-    course = courses_collection.find_one({"_id": course_key})
-    if course and course.get("demo_lectures", {}).get("subjects"):
-        subjects = course["demo_lectures"]["subjects"]
-        keyboard = []
-        for key, details in subjects.items():
-            keyboard.append([InlineKeyboardButton(details["button_text"], callback_data=f"demo_{course_key}_{key}")])
-        keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data=course_key)])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("Please select a subject to watch the demo lecture:", reply_markup=reply_markup)
-        return SELECTING_DEMO_SUBJECT
-    
-    await query.edit_message_text("No demo lectures available for this course.")
-    return SELECTING_ACTION
+    course_key = query.data.removeprefix("action_demo_")
+    return await show_demo_menu(query, course_key)
 
 async def send_demo_lecture(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer("Forwarding lecture, please wait...")
     
-    _, course_key, subject_key = query.data.split('_')
+    match = DEMO_SUBJECT_PATTERN.match(query.data)
+    course_key, subject_key = match["course"], match["subject"]
     
-    course = courses_collection.find_one({"_id": course_key})
+    course = await get_course(course_key)
     if course:
         demo_info = course["demo_lectures"]
         subject_info = demo_info["subjects"].get(subject_key)
         
         if subject_info:
+            # Multi-part demos are stored as "message_ids" and go out in one
+            # copyMessages call instead of one request per part.
+            message_ids = subject_info.get("message_ids")
             try:
-                await context.bot.copy_message(
-                    chat_id=query.from_user.id,
-                    from_chat_id=demo_info["channel_id"],
-                    message_id=subject_info["message_id"]
-                )
+                if message_ids:
+                    await context.bot.copy_messages(
+                        chat_id=query.from_user.id,
+                        from_chat_id=demo_info["channel_id"],
+                        message_ids=message_ids
+                    )
+                else:
+                    await context.bot.copy_message(
+                        chat_id=query.from_user.id,
+                        from_chat_id=demo_info["channel_id"],
+                        message_id=subject_info["message_id"]
+                    )
             except Exception as e:
                 logger.error(f"Failed to copy message: {e}")
                 await query.message.reply_text("Sorry, there was an error fetching the lecture. Please try again later.")
-    
-    query.data = f"action_demo_{course_key}" # Hack to reuse the demo selection handler
-    return await handle_demo_selection(update, context)
+            # The subject menu the user tapped is still on screen; redrawing it
+            # unchanged would fail with "message is not modified".
+            return SELECTING_DEMO_SUBJECT
+
+    return await show_demo_menu(query, course_key)
 
 async def handle_talk_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
@@ -271,23 +563,20 @@ async def handle_talk_to_admin(update: Update, context: ContextTypes.DEFAULT_TYP
 async def handle_buy_course(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    course_key = query.data.split('_')[-1]
-    course = context.user_data.get('selected_course')
-    
-    if not course or course['_id'] != course_key:
-        course = courses_collection.find_one({"_id": course_key})
-        context.user_data['selected_course'] = course
+    course_key = query.data.removeprefix("action_buy_")
+    course = await get_course(course_key)
 
     if not course:
         await query.edit_message_text("Error: Course not found. Please go /start")
         return SELECTING_ACTION
+    context.user_data['selected_course_key'] = course_key
 
     keyboard = [
         [InlineKeyboardButton(f"💳 Pay ₹{course['price']} Now", url=RAZORPAY_LINK)],
         [InlineKeyboardButton("✅ Already Paid? Share Screenshot", callback_data=f"action_screenshot_{course_key}")],
         [InlineKeyboardButton("⬅️ Back", callback_data=course_key)] 
     ]
-    buy_text = BUY_COURSE_TEXT.format(course_name=escape_markdown(course['name']), price=course['price'])
+    buy_text = render_buy_text(course['name'], course['price'])
     await query.edit_message_text(text=buy_text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode=ParseMode.MARKDOWN_V2)
     return SELECTING_ACTION
 
@@ -297,34 +586,42 @@ async def handle_share_screenshot(update: Update, context: ContextTypes.DEFAULT_
     await query.edit_message_text(text="Please send the screenshot of your payment now\.")
     return FORWARD_SCREENSHOT
 
+async def get_selected_course_name(context: ContextTypes.DEFAULT_TYPE) -> str:
+    # user_data only keeps the key; the document comes from the course cache.
+    course_key = context.user_data.get('selected_course_key')
+    course = await get_course(course_key) if course_key else None
+    return course['name'] if course else 'Not specified'
+
 async def forward_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
-    course = context.user_data.get('selected_course', {'name': 'Not specified'})
+    course_name = await get_selected_course_name(context)
     
     context.bot_data[f"last_chat_with_{ADMIN_ID}"] = user.id
 
     escaped_message = escape_markdown(update.message.text)
     forward_text = (
         f"📩 New message from {escape_markdown(user.full_name)} \(ID: `{user.id}`\)\n"
-        f"Regarding course: *{escape_markdown(course['name'])}*\n\n"
+        f"Regarding course: *{escape_markdown(course_name)}*\n\n"
         f"Message:\n{escaped_message}"
     )
-    await context.bot.send_message(chat_id=ADMIN_ID, text=forward_text, parse_mode=ParseMode.MARKDOWN_V2)
+    sent = await context.bot.send_message(chat_id=ADMIN_ID, text=forward_text, parse_mode=ParseMode.MARKDOWN_V2)
+    remember_forwarded_message(context, sent, user.id)
     await update.message.reply_text("✅ Your message has been sent to the admin\. They will reply to you here shortly\.")
     return await main_menu_from_message(update, context)
 
 async def forward_screenshot_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
-    course = context.user_data.get('selected_course', {'name': 'Not specified'})
+    course_name = await get_selected_course_name(context)
 
     context.bot_data[f"last_chat_with_{ADMIN_ID}"] = user.id
 
     caption = (
         f"📸 New payment screenshot from: {escape_markdown(user.full_name)} \(ID: `{user.id}`\)\n"
-        f"For course: *{escape_markdown(course['name'])}*\n\n"
+        f"For course: *{escape_markdown(course_name)}*\n\n"
         f"Reply to this message to send the course link to the user\."
     )
-    await context.bot.send_photo(chat_id=ADMIN_ID, photo=update.message.photo[-1].file_id, caption=caption, parse_mode=ParseMode.MARKDOWN_V2)
+    sent = await context.bot.send_photo(chat_id=ADMIN_ID, photo=update.message.photo[-1].file_id, caption=caption, parse_mode=ParseMode.MARKDOWN_V2)
+    remember_forwarded_message(context, sent, user.id)
     await update.message.reply_text("✅ Screenshot received\! The admin will verify it and send you the course link here soon\.")
     return await main_menu_from_message(update, context)
 
@@ -341,42 +638,47 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 async def list_courses(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update): return
-    courses = list(courses_collection.find().sort("order", 1))
+    courses = await get_courses()
     if not courses:
         await update.message.reply_text("No courses defined\. Use `/addcourse`\.", parse_mode=ParseMode.MARKDOWN_V2)
         return
-    courses_info = "*📚 Current Courses:*\n\n"
-    for course in courses:
-        courses_info += (
-            f"*Key:* `{course['_id']}`\n"
-            f"*Name:* {escape_markdown(course['name'])}\n"
-            f"*Price:* ₹{course['price']}\n"
-            f"*Status:* {escape_markdown(course.get('status', 'N/A').replace('_', ' ').title())}\n"
-            f"*Order:* {course.get('order', 'Not Set')}\n"
-            f"\-\-\-\-\-\-\-\-\-\-\n"
-        )
+    courses_info = "*📚 Current Courses:*\n\n" + "".join(
+        f"*Key:* `{course['_id']}`\n"
+        f"*Name:* {escape_markdown(course['name'])}\n"
+        f"*Price:* ₹{course['price']}\n"
+        f"*Status:* {escape_markdown(course.get('status', 'N/A').replace('_', ' ').title())}\n"
+        f"*Order:* {course.get('order', 'Not Set')}\n"
+        f"\-\-\-\-\-\-\-\-\-\-\n"
+        for course in courses
+    )
     await update.message.reply_text(courses_info, parse_mode=ParseMode.MARKDOWN_V2)
 
+async def next_course_order() -> int:
+    # Highest existing order plus one, read off the end of the order index.
+    # Unlike a document count this stays unique after deletes and /set_order.
+    last = await courses_collection.find_one({}, {"order": 1}, sort=[("order", -1)])
+    return (last.get("order") or 0) + 1 if last else 1
+
 async def add_course(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update): return
     try:
-        args_str = " ".join(context.args)
-        key, name, price_str, status = [p.strip() for p in args_str.split(';')]
+        key, name, price_str, status = split_command_args(context.args)
         status = status.lower()
         if status not in ["available", "coming_soon"]: raise ValueError("Invalid status")
         price = int(price_str)
         if price < 0: raise ValueError("Negative price")
 
-        if courses_collection.find_one({"_id": key}):
+        if await courses_collection.find_one({"_id": key}):
              await update.message.reply_text(f"❌ Course with key `{key}` already exists\.", parse_mode=ParseMode.MARKDOWN_V2)
              return
 
         new_course = {
             "_id": key, "name": name, "price": price, "status": status,
-            "order": courses_collection.count_documents({}) + 1,
+            "order": await next_course_order(),
             "demo_lectures": {"channel_id": None, "subjects": {}}
         }
-        courses_collection.insert_one(new_course)
+        await courses_collection.insert_one(new_course)
+        invalidate_course_cache()
         await update.message.reply_text(f"✅ Course `{escape_markdown(name)}` \(key: `{key}`\) added\.", parse_mode=ParseMode.MARKDOWN_V2)
     except Exception as e:
         logger.error(f"Error in add_course: {e}")
@@ -385,18 +687,19 @@ async def add_course(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 async def edit_course(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update): return
     try:
-        args_str = " ".join(context.args)
-        key, new_name, new_price_str, new_status = [p.strip() for p in args_str.split(';')]
+        key, new_name, new_price_str, new_status = split_command_args(context.args)
         new_status = new_status.lower()
         if new_status not in ["available", "coming_soon"]: raise ValueError("Invalid status")
         new_price = int(new_price_str)
         if new_price < 0: raise ValueError("Negative price")
         
-        result = courses_collection.update_one(
+        result = await courses_collection.update_one(
             {"_id": key},
             {"$set": {"name": new_name, "price": new_price, "status": new_status}}
         )
         if result.matched_count > 0:
+            invalidate_course_cache()
+            invalidate_course(key)
             await update.message.reply_text(f"✅ Course `{key}` updated\.", parse_mode=ParseMode.MARKDOWN_V2)
         else:
             await update.message.reply_text(f"❌ Course with key `{key}` not found\.", parse_mode=ParseMode.MARKDOWN_V2)
@@ -408,8 +711,10 @@ async def delete_course(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     if not is_admin(update): return
     try:
         key = context.args[0]
-        result = courses_collection.delete_one({"_id": key})
+        result = await courses_collection.delete_one({"_id": key})
         if result.deleted_count > 0:
+            invalidate_course_cache()
+            invalidate_course(key)
             await update.message.reply_text(f"✅ Course `{key}` deleted\.", parse_mode=ParseMode.MARKDOWN_V2)
         else:
             await update.message.reply_text(f"❌ Course with key `{key}` not found\.", parse_mode=ParseMode.MARKDOWN_V2)
@@ -421,50 +726,97 @@ async def set_course_order(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     try:
         key, order_str = context.args
         order = int(order_str)
-        result = courses_collection.update_one({"_id": key}, {"$set": {"order": order}})
+        result = await courses_collection.update_one({"_id": key}, {"$set": {"order": order}})
         if result.matched_count > 0:
+            invalidate_course_cache()
             await update.message.reply_text(f"✅ Order for course `{key}` set to {order}\.", parse_mode=ParseMode.MARKDOWN_V2)
         else:
             await update.message.reply_text(f"❌ Course with key `{key}` not found\.", parse_mode=ParseMode.MARKDOWN_V2)
     except (IndexError, ValueError):
         await update.message.reply_text("Usage: `/set_order <key> <order_number>`", parse_mode=ParseMode.MARKDOWN_V2)
 
+async def reorder_courses(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not is_admin(update): return
+    keys = [k.strip() for k in " ".join(context.args).split(',') if k.strip()]
+    if not keys or len(set(keys)) != len(keys):
+        await update.message.reply_text("Usage: `/reorder <key1>,<key2>,<key3>`", parse_mode=ParseMode.MARKDOWN_V2)
+        return
+
+    current = [c["_id"] for c in await courses_collection.find({}, {"_id": 1}).sort("order", 1).to_list(length=None)]
+    unknown = set(keys).difference(current)
+    if unknown:
+        await update.message.reply_text(
+            f"❌ Unknown course keys: {escape_markdown(', '.join(sorted(unknown)))}\. Nothing was reordered\.",
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+        return
+
+    # Courses not listed follow the listed ones in their current order, so
+    # every course ends up with a distinct position. One round trip for all.
+    listed = set(keys)
+    new_order = keys + [key for key in current if key not in listed]
+    await courses_collection.bulk_write(
+        [UpdateOne({"_id": key}, {"$set": {"order": order}}) for order, key in enumerate(new_order, 1)],
+        ordered=False,
+    )
+    invalidate_course_cache()
+    await update.message.reply_text(
+        f"✅ Reordered {len(new_order)} courses, with the {len(keys)} listed first\.",
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+
 async def add_demo_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update): return
     try:
-        args_str = " ".join(context.args)
-        course_key, subject_key, msg_id_str, button_text = [p.strip() for p in args_str.split(';')]
-        msg_id = int(msg_id_str)
-        
+        course_key, subject_key, msg_ids_str, button_text = split_command_args(context.args)
+        if not subject_key or "_" in subject_key: raise ValueError("Invalid subject key")
+        # copyMessages wants 1-100 ids in strictly increasing order.
+        msg_ids = sorted({int(msg_id) for msg_id in msg_ids_str.split(',')})
+        if len(msg_ids) > 100: raise ValueError("Too many message ids")
+
+        subject = {"button_text": button_text}
+        if len(msg_ids) == 1:
+            subject["message_id"] = msg_ids[0]
+        else:
+            subject["message_ids"] = msg_ids
         update_field = f"demo_lectures.subjects.{subject_key}"
-        result = courses_collection.update_one(
+        result = await courses_collection.update_one(
             {"_id": course_key},
-            {"$set": {update_field: {"button_text": button_text, "message_id": msg_id}}}
+            {"$set": {update_field: subject}}
         )
         if result.matched_count > 0:
-            await update.message.reply_text(f"✅ Demo lecture added/updated for course `{course_key}`.", parse_mode=ParseMode.MARKDOWN_V2)
+            invalidate_course(course_key)
+            await update.message.reply_text(f"✅ Demo lecture added/updated for course `{course_key}`\.", parse_mode=ParseMode.MARKDOWN_V2)
         else:
             await update.message.reply_text(f"❌ Course with key `{course_key}` not found\.", parse_mode=ParseMode.MARKDOWN_V2)
             
     except Exception as e:
         logger.error(f"Error in adddemo: {e}")
-        await update.message.reply_text("Usage: `/adddemo <course_key>; <subject_key>; <msg_id>; <button_text>`", parse_mode=ParseMode.MARKDOWN_V2)
+        await update.message.reply_text("Usage: `/adddemo <course_key>; <subject_key>; <msg_id>[,<msg_id>\.\.\.]; <button_text>`", parse_mode=ParseMode.MARKDOWN_V2)
 
 async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update): return
     
-    total_users = users_collection.count_documents({})
-    stats_text = f"📊 *Bot Statistics*\n\n*Total Users:* `{total_users}`\n\n*User List:*\n"
-    
-    users = list(users_collection.find())
-    if not users:
-        stats_text += "  _No users have started the bot\._\n"
-    else:
-        for user in users:
-            username = f"\(@{escape_markdown(user.get('username', ''))}\)" if user.get('username') else ""
-            stats_text += f"  \- {escape_markdown(user.get('first_name', 'N/A'))} {username} ID: `{user['_id']}`\n"
-
-    await update.message.reply_text(stats_text, parse_mode=ParseMode.MARKDOWN_V2)
+    # Collection metadata instead of a full count; the list below is streamed
+    # page by page so memory stays flat however many users there are.
+    total_users = await users_collection.estimated_document_count()
+    page = [f"📊 *Bot Statistics*\n\n*Total Users:* `{total_users}`\n\n*User List:*\n"]
+    page_size = len(page[0])
+    has_users = False
+
+    async for user in users_collection.find({}, USER_STATS_PROJECTION):
+        has_users = True
+        username = f"\(@{escape_markdown(user.get('username', ''))}\)" if user.get('username') else ""
+        line = f"  \- {escape_markdown(user.get('first_name', 'N/A'))} {username} ID: `{user['_id']}`\n"
+        if page_size + len(line) > MESSAGE_PAGE_SIZE:
+            await update.message.reply_text("".join(page), parse_mode=ParseMode.MARKDOWN_V2)
+            page, page_size = [], 0
+        page.append(line)
+        page_size += len(line)
+
+    if not has_users:
+        page.append("  _No users have started the bot\._\n")
+    await update.message.reply_text("".join(page), parse_mode=ParseMode.MARKDOWN_V2)
 
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_admin(update): return
@@ -473,15 +825,22 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("Usage: `/broadcast <your message>`", parse_mode=ParseMode.MARKDOWN_V2)
         return
     
-    user_ids = [user["_id"] for user in users_collection.find({}, {"_id": 1})]
-    sent_count, failed_count = 0, 0
-    for user_id in user_ids:
-        try:
-            await context.bot.send_message(chat_id=int(user_id), text=message)
-            sent_count += 1
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"Failed to send broadcast to {user_id}: {e}")
+    user_ids = [user["_id"] async for user in users_collection.find({}, {"_id": 1})]
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+    async def send(user_id) -> bool:
+        async with semaphore:
+            try:
+                await context.bot.send_message(chat_id=int(user_id), text=message)
+                return True
+            except Exception as e:
+                logger.error(f"Failed to send broadcast to {user_id}: {e}")
+                return False
+
+    # Pacing and 429 retries are handled by the application's rate limiter.
+    results = await asyncio.gather(*(send(user_id) for user_id in user_ids))
+    sent_count = sum(results)
+    failed_count = len(results) - sent_count
     await update.message.reply_text(f"📢 Broadcast finished\.\nSent: {sent_count}\nFailed: {failed_count}", parse_mode=ParseMode.MARKDOWN_V2)
 
 async def reply_by_id_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -505,12 +864,19 @@ async def reply_to_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
     original_msg = update.message.reply_to_message
     original_text = original_msg.text or original_msg.caption
-    user_id = None
-
-    if original_text:
-        match = re.search(r'\(ID: `(\d+)`\)', original_text)
-        if match:
-            user_id = int(match.group(1))
+    user_id = context.bot_data.get("forwarded_messages", {}).get(original_msg.message_id)
+
+    # Messages forwarded before a restart are not in the map; fall back to the ID tag.
+    if not user_id and original_text:
+        user_id = extract_tagged_user_id(original_msg)
+        # A tagged message was addressed to one specific user; never guess
+        # with the last-chat fallback below if the tag can't be read.
+        if not user_id and "(ID:" in original_text:
+            await update.message.reply_text(
+                "❌ Could not read the user ID on that message\. Please use the `/reply <id> <msg>` command\.",
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+            return
 
     if not user_id and original_msg.from_user.is_bot:
         last_user_id_key = f"last_chat_with_{ADMIN_ID}"
@@ -542,7 +908,8 @@ async def handle_user_reply(update: Update, context: ContextTypes.DEFAULT_TYPE)
         context.bot_data[f"last_chat_with_{ADMIN_ID}"] = user.id
 
         forward_text = f"↪️ Follow\-up from {escape_markdown(user.full_name)} \(ID: `{user.id}`\):\n\n{escape_markdown(update.message.text)}"
-        await context.bot.send_message(chat_id=ADMIN_ID, text=forward_text, parse_mode=ParseMode.MARKDOWN_V2)
+        sent = await context.bot.send_message(chat_id=ADMIN_ID, text=forward_text, parse_mode=ParseMode.MARKDOWN_V2)
+        remember_forwarded_message(context, sent, user.id)
         await update.message.reply_text("✅ Your reply has been sent\.")
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -553,35 +920,134 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     except Exception as e:
         logger.error(f"Failed to send error alert to admin: {e}")
 
+# --- Bot API Requests ---
+class OrjsonHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that decodes Bot API responses with orjson when it is installed."""
+
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict:
+        if orjson is not None:
+            try:
+                return orjson.loads(payload)
+            except orjson.JSONDecodeError:
+                pass
+        return HTTPXRequest.parse_json_payload(payload)
+
+# --- Update Processing ---
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates from different chats concurrently, in order within a chat."""
+
+    # PTB's process_update takes the base semaphore before do_process_update,
+    # so updates queued behind their chat's lock would hold slots and starve
+    # other chats. Keep that semaphore out of the way and enforce the real
+    # limit only once an update holds its chat's lock.
+    _UNBOUNDED = 2 ** 31 - 1
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(self._UNBOUNDED)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks = {}
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chat_locks.get(chat.id)
+        if entry is None:
+            entry = self._chat_locks[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
 # --- Main Application Setup ---
+async def ensure_indexes() -> None:
+    try:
+        # Only "order" is queried besides _id; the default index name keeps
+        # this idempotent against databases that already have it.
+        await courses_collection.create_indexes([IndexModel([("order", 1)])])
+    except Exception as e:
+        logger.error(f"Failed to create MongoDB indexes: {e}")
+
+async def connect_to_database() -> None:
+    # The client connects lazily; ping once so startup fails fast on a bad
+    # URL and the pool is warm before the first update arrives.
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        logger.error(f"FATAL: Could not connect to MongoDB: {e}")
+        raise
+    pool_options = client.options.pool_options
+    logger.info(
+        f"Successfully connected to MongoDB (pool {pool_options.min_pool_size}-{pool_options.max_pool_size}, "
+        f"wait queue timeout {pool_options.wait_queue_timeout}s)."
+    )
+
+async def post_init(application: Application) -> None:
+    global _user_flush_task
+    await connect_to_database()
+    await ensure_indexes()
+    # In webhook mode PTB's own web server owns PORT.
+    if not WEBHOOK_URL:
+        await start_web_server()
+    _user_flush_task = asyncio.create_task(user_flush_loop())
+
+async def post_shutdown(application: Application) -> None:
+    if _user_flush_task is not None:
+        _user_flush_stopping.set()
+        _user_batch_full.set()
+        await _user_flush_task
+    await flush_pending_users()
+    await stop_web_server()
+
 def main() -> None:
     if not all([BOT_TOKEN, ADMIN_ID, MONGO_DB_URL]):
         logger.error("FATAL: One or more critical environment variables are missing.")
         return
 
-    web_thread = threading.Thread(target=run_web_server)
-    web_thread.daemon = True
-    web_thread.start()
-
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(OrjsonHTTPXRequest(connection_pool_size=MAX_CONCURRENT_UPDATES))
+        .get_updates_request(OrjsonHTTPXRequest(connection_pool_size=1))
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .rate_limiter(AIORateLimiter(max_retries=RATE_LIMIT_MAX_RETRIES))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
         states={
             SELECTING_ACTION: [
-                CallbackQueryHandler(main_menu_from_callback, pattern="^main_menu$"),
-                CallbackQueryHandler(handle_demo_selection, pattern="^action_demo_"),
-                CallbackQueryHandler(handle_talk_to_admin, pattern="^action_talk_admin_"),
-                CallbackQueryHandler(handle_buy_course, pattern="^action_buy_"),
-                CallbackQueryHandler(handle_share_screenshot, pattern="^action_screenshot_"),
-                CallbackQueryHandler(course_selection_callback, pattern="^(?!main_menu$|action_demo_|action_talk_admin_|action_buy_|action_screenshot_).*$"),
+                CallbackQueryHandler(main_menu_from_callback, pattern=MAIN_MENU_PATTERN),
+                CallbackQueryHandler(handle_demo_selection, pattern=DEMO_ACTION_PATTERN),
+                CallbackQueryHandler(handle_talk_to_admin, pattern=TALK_ADMIN_ACTION_PATTERN),
+                CallbackQueryHandler(handle_buy_course, pattern=BUY_ACTION_PATTERN),
+                CallbackQueryHandler(handle_share_screenshot, pattern=SCREENSHOT_ACTION_PATTERN),
+                # Handlers are tried in order, so anything left over is a course key.
+                CallbackQueryHandler(course_selection_callback),
             ],
             SELECTING_DEMO_SUBJECT: [
-                CallbackQueryHandler(send_demo_lecture, pattern="^demo_"),
-                CallbackQueryHandler(course_selection_callback, pattern="^(?!demo_).*$"),
+                CallbackQueryHandler(send_demo_lecture, pattern=DEMO_SUBJECT_PATTERN),
+                CallbackQueryHandler(course_selection_callback),
             ],
             FORWARD_TO_ADMIN: [MessageHandler(filters.TEXT & ~filters.COMMAND, forward_to_admin)],
-            FORWARD_SCREENSHOT: [MessageHandler(filters.PHOTO, forward_screenshot_to_admin)],
+            FORWARD_SCREENSHOT: [MessageHandler(filters.PHOTO, forward_screenshot_to_admin, block=False)],
         },
         fallbacks=[CommandHandler("start", start)],
     )
@@ -596,9 +1062,10 @@ def main() -> None:
     application.add_handler(CommandHandler("editcourse", edit_course))
     application.add_handler(CommandHandler("delcourse", delete_course))
     application.add_handler(CommandHandler("set_order", set_course_order))
+    application.add_handler(CommandHandler("reorder", reorder_courses))
     application.add_handler(CommandHandler("adddemo", add_demo_command))
     application.add_handler(CommandHandler("stats", show_stats))
-    application.add_handler(CommandHandler("broadcast", broadcast))
+    application.add_handler(CommandHandler("broadcast", broadcast, block=False))
     application.add_handler(CommandHandler("reply", reply_by_id_command))
 
     # Reply Handlers
@@ -607,8 +1074,21 @@ def main() -> None:
     
     application.add_error_handler(error_handler)
 
-    logger.info("Starting Telegram bot polling...")
-    application.run_polling()
+    if WEBHOOK_URL:
+        port = int(os.environ.get("PORT", 8080))
+        logger.info(f"Starting Telegram bot webhook on port {port}...")
+        logger.warning("Webhook mode: no health check endpoint is served; GET / returns 404.")
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=port,
+            url_path="webhook",
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/webhook",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=100,
+        )
+    else:
+        logger.info("Starting Telegram bot polling...")
+        application.run_polling()
 
 if __name__ == "__main__":
     main()